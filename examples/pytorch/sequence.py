@@ -2,19 +2,17 @@
 
     By default, GroqFlow completes the following steps:
      > Convert to ONNX
-     > Optimize ONNX file
+     > Optimize ONNX file and convert to FP16
      > Check op support
-     > Convert to FP16
      > Compile Model
      > Assemble Model
 
     This example illustrates how to alter the default sequence of steps. In this
-    example, the conversion to FP16 is skipped.
+    example, the ONNX file is optimized but the conversion to FP16 is skipped.
 """
 
 import torch
 from groqflow import groqit
-import onnxflow.justbuildit.export as of_export
 import onnxflow.justbuildit.stage as stage
 import groqflow.justgroqit.compile as compile
 import groqflow.justgroqit.export as gf_export
@@ -44,10 +42,10 @@ onnx_sequence = stage.Sequence(
     "onnx_sequence",
     "Building ONNX Model without fp16 conversion",
     [
-        of_export.ExportPytorchModel(),
-        of_export.OptimizeOnnxModel(),
+        gf_export.ExportPytorchModel(),
+        gf_export.OptimizeOnnxModel(),
         gf_export.CheckOnnxCompatibility(),
-        # of_export.ConvertOnnxToFp16(),  #<-- This is the step we want to skip
+        # gf_export.ConvertOnnxToFp16(),  #<-- This is the step we want to skip
         compile.CompileOnnx(),
         compile.Assemble(),
     ],
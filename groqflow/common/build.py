@@ -10,6 +10,9 @@ from groqflow.version import __version__ as groqflow_version
 DEFAULT_ONNX_OPSET = 16
 MINIMUM_ONNX_OPSET = 13
 
+# Models with more bytes of trained parameters than this are considered large
+LARGE_MODEL_BYTES = 1024**3
+
 # Identifiers for specific GroqCard Accelerators
 GROQCARD_A14 = "A1.4"
 
@@ -168,6 +171,9 @@ class GroqInfo(of_build.Info):
     """
 
     num_parameters: Optional[int] = None
+    base_onnx_bytes: Optional[int] = None
+    onnx_opt_level: Optional[str] = None
+    last_checked_signature: Optional[List[int]] = None
     opt_onnx_unsupported_ops: Optional[List[str]] = None
     opt_onnx_all_ops_supported: Optional[bool] = None
     compiler_success: Optional[bool] = None
@@ -2,11 +2,178 @@
 Helper functions for dealing with ONNX files and ONNX models
 """
 
+import os
 import subprocess
 import ast
+import itertools
+from typing import Set
+import onnx
+import onnx.external_data_helper
 import onnxflow.common.printing as printing
+import groqflow.common.build as build
 import groqflow.common.sdk_helpers as sdk
 
+# Tensors smaller than this stay inline when a model is saved with external data
+EXTERNAL_DATA_MIN_BYTES = 1024
+
+
+def external_data_location(onnx_file: str) -> str:
+    """
+    Name of the file, next to onnx_file, that holds its external data
+    """
+
+    return os.path.basename(onnx_file) + ".data"
+
+
+def external_data_bytes(model: onnx.ModelProto, base_dir: str) -> int:
+    """
+    Number of bytes of trained parameters that a model stores in external
+    data files, according to the external_data entries of its initializers.
+    base_dir is the directory of the model's ONNX file, which the entries'
+    locations are relative to.
+    """
+
+    size = 0
+    for tensor in model.graph.initializer:
+        if not onnx.external_data_helper.uses_external_data(tensor):
+            continue
+        info = onnx.external_data_helper.ExternalDataInfo(tensor)
+        if info.length is not None:
+            size += info.length
+        else:
+            # Tensors without a length span the rest of their location file
+            location = os.path.join(base_dir, info.location)
+            size += os.path.getsize(location) - (info.offset or 0)
+    return size
+
+
+def model_file_bytes(onnx_file: str) -> int:
+    """
+    Size of an ONNX file, including the trained parameters that it
+    stores in external data files, if any
+    """
+
+    model = onnx.load_model(onnx_file, load_external_data=False)
+    return os.path.getsize(onnx_file) + external_data_bytes(
+        model, os.path.dirname(onnx_file)
+    )
+
+
+def save_model(model: onnx.ModelProto, onnx_file: str):
+    """
+    Save a model to an ONNX file. The trained parameters of large models
+    are saved to an external data file next to onnx_file, which avoids the
+    2GB protobuf limit and lets readers memory-map the parameters.
+    """
+
+    # onnx appends to existing external data files, so start from scratch
+    data_file = os.path.join(
+        os.path.dirname(onnx_file), external_data_location(onnx_file)
+    )
+    if os.path.isfile(data_file):
+        os.remove(data_file)
+
+    if model.ByteSize() > build.LARGE_MODEL_BYTES:
+        onnx.external_data_helper.convert_model_to_external_data(
+            model,
+            all_tensors_to_one_file=True,
+            location=external_data_location(onnx_file),
+            size_threshold=EXTERNAL_DATA_MIN_BYTES,
+            convert_attribute=False,
+        )
+
+    onnx.save_model(model, onnx_file)
+
+
+def load_model_metadata(onnx_file: str) -> onnx.ModelProto:
+    """
+    Load an ONNX file without its trained parameters, for when only the
+    graph's metadata (e.g., opset and input shapes) is needed
+    """
+
+    model = onnx.load_model(onnx_file, load_external_data=False)
+    model.graph.ClearField("initializer")
+    return model
+
+
+def get_opset(model: onnx.ModelProto) -> int:
+    """
+    Return the version of the default ONNX domain opset used by a model
+    """
+
+    return max(
+        (o.version for o in model.opset_import if o.domain in ("", "ai.onnx")),
+        default=0,
+    )
+
+
+def has_float32_tensors(model: onnx.ModelProto) -> bool:
+    """
+    Whether any of the graph inputs, graph outputs, trained parameters, or
+    constants of a model are float32, or any of its nodes cast to float32.
+    Models with subgraphs (e.g., If and Loop bodies) are conservatively
+    reported as having float32 tensors.
+    """
+
+    graph = model.graph
+    float32 = onnx.TensorProto.FLOAT
+
+    def float32_attribute(node: onnx.NodeProto, attr: onnx.AttributeProto) -> bool:
+        if node.op_type == "Cast":
+            return attr.name == "to" and attr.i == float32
+        if node.op_type == "Constant":
+            return attr.name in ("value_float", "value_floats") or (
+                attr.type == onnx.AttributeProto.TENSOR and attr.t.data_type == float32
+            )
+        return False
+
+    subgraph_types = (onnx.AttributeProto.GRAPH, onnx.AttributeProto.GRAPHS)
+
+    return (
+        any(
+            value.type.tensor_type.elem_type == float32
+            for value in itertools.chain(graph.input, graph.output)
+        )
+        or any(init.data_type == float32 for init in graph.initializer)
+        or any(
+            attr.type in subgraph_types or float32_attribute(node, attr)
+            for node in graph.node
+            for attr in node.attribute
+        )
+    )
+
+
+def custom_domains(model: onnx.ModelProto) -> Set[str]:
+    """
+    Domains, other than the default ONNX domain, used by the nodes of a model
+    """
+
+    return {
+        node.domain
+        for node in model.graph.node
+        if node.domain not in ("", "ai.onnx")
+    }
+
+
+def unregistered_ops(model: onnx.ModelProto) -> Set[str]:
+    """
+    Ops in the default ONNX domain that ONNX does not define at the model's
+    opset (e.g., ONNX Runtime contrib ops that share the default domain)
+    """
+
+    opset = get_opset(model)
+    op_types = {
+        node.op_type for node in model.graph.node if node.domain in ("", "ai.onnx")
+    }
+
+    unregistered = set()
+    for op_type in op_types:
+        try:
+            onnx.defs.get_schema(op_type, opset, "")
+        except onnx.defs.SchemaError:
+            unregistered.add(op_type)
+    return unregistered
+
 
 def check_ops(input_onnx, use_sdk=False):
 
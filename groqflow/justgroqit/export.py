@@ -1,10 +1,780 @@
+import os
+import sys
+import shutil
+import copy
+import inspect
+import itertools
+import functools
+import warnings
+import dataclasses
+import concurrent.futures
+from typing import Tuple, List, Optional
+import torch
+import onnx
+import onnx.external_data_helper
+from packaging import version
 import onnxflow.justbuildit.stage as stage
+import onnxflow.justbuildit.export as of_export
 import onnxflow.common.exceptions as exp
+import onnxflow.common.printing as printing
+import onnxflow.common.tensor_helpers as tensor_helpers
 import groqflow.common.build as build
 import groqflow.common.onnx_helpers as onnx_helpers
 import groqflow.common.sdk_helpers as sdk
 
 
+# Ops that have been, or currently are, in onnxconverter-common's
+# default FP16 block list that we explicitly want converted to FP16
+FP16_LEGALIZE_OPS = ["InstanceNormalization", "Resize", "Max"]
+
+# Identifiers for ONNX Runtime graph optimization levels
+ORT_OPT_LEVEL_BASIC = "basic"
+ORT_OPT_LEVEL_EXTENDED = "extended"
+
+# ONNX Runtime's extended-level fusions that produce contrib ops (e.g., FusedGemm
+# and Attention in the com.microsoft domain, or LayerNormalization below opset 17),
+# which Groq Compiler does not support
+ORT_CONTRIB_FUSIONS = [
+    "AttentionFusion",
+    "BiasDropoutFusion",
+    "BiasGeluFusion",
+    "BiasSoftmaxFusion",
+    "ConvActivationFusion",
+    "ConvAddActivationFusion",
+    "DynamicQuantizeMatMulFusion",
+    "EmbedLayerNormFusion",
+    "FastGeluFusion",
+    "GeluFusion",
+    "GemmActivationFusion",
+    "LayerNormFusion",
+    "MatMulIntegerToFloatFusion",
+    "MatMulScaleFusion",
+    "MatmulTransposeFusion",
+    "QuickGeluFusion",
+    "SimplifiedLayerNormFusion",
+    "SkipLayerNormFusion",
+]
+
+# Identifiers for the precision of the trained parameters of exported models
+EXPORT_PRECISION_FP32 = "fp32"
+EXPORT_PRECISION_FP16 = "fp16"
+
+# Opset of the models that torch.onnx.dynamo_export() produces
+DYNAMO_EXPORT_OPSET = 18
+
+
+def _warn_to_stdout(message, category, filename, line_number, _, line):
+    sys.stdout.write(
+        warnings.formatwarning(message, category, filename, line_number, line)
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _class_forward_arg_names(model_class) -> Tuple[str, ...]:
+    # Skip the "self" argument
+    return tuple(inspect.signature(model_class.forward).parameters)[1:]
+
+
+def _forward_arg_names(model) -> Tuple[str, ...]:
+    """
+    Names of the arguments of a torch.nn.Module's forward() method, in order.
+    inspect.signature() is slow, so results are cached per class, except for
+    models whose forward() was replaced on the instance (e.g., by hooks).
+    """
+
+    if "forward" in vars(model):
+        return tuple(inspect.signature(model.forward).parameters)
+
+    return _class_forward_arg_names(type(model))
+
+
+def _merge_state_changes(state, original_info, child_state):
+    """
+    Copy the members of child_state (and its info) that a stage changed
+    back into state. original_info is a snapshot of state.info taken before
+    the stage was fired.
+    """
+
+    for field in dataclasses.fields(state):
+        if field.name == "info":
+            continue
+        value = getattr(child_state, field.name)
+        if value is not getattr(state, field.name):
+            setattr(state, field.name, value)
+
+    for field in dataclasses.fields(original_info):
+        value = getattr(child_state.info, field.name)
+        if value is not getattr(original_info, field.name):
+            setattr(state.info, field.name, value)
+
+
+def _run_in_background(fn, *args, **kwargs) -> concurrent.futures.Future:
+    """
+    Run fn in a background thread. Calling result() on the returned future
+    waits for fn to finish and raises any exception that fn raised.
+    """
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    future = executor.submit(fn, *args, **kwargs)
+    executor.shutdown(wait=False)
+    return future
+
+
+def _dynamo_export(
+    model: torch.nn.Module,
+    dummy_inputs: Tuple,
+    input_names: Tuple[str, ...],
+    output_onnx: str,
+    opset: int,
+) -> bool:
+    """
+    Export model to output_onnx with torch.onnx.dynamo_export(). Returns
+    whether the exported model has the input names and opset that
+    torch.onnx.export() would have produced, which later stages rely on.
+    Otherwise, no file is left at output_onnx.
+    """
+
+    exported = False
+    try:
+        onnx_program = torch.onnx.dynamo_export(
+            model, dummy_inputs[0], **dummy_inputs[1]
+        )
+        onnx_program.save(output_onnx)
+
+        exported_model = onnx_helpers.load_model_metadata(output_onnx)
+        exported_input_names = tuple(
+            _input.name for _input in exported_model.graph.input
+        )
+        exported_opset = onnx_helpers.get_opset(exported_model)
+        if exported_input_names != input_names:
+            print(
+                f"Dynamo-based export produced input names {exported_input_names} "
+                f"instead of {input_names}, falling back to torch.onnx.export()"
+            )
+        elif exported_opset != opset:
+            print(
+                f"Dynamo-based export produced opset {exported_opset} instead "
+                f"of {opset}, falling back to torch.onnx.export()"
+            )
+        else:
+            exported = True
+    except Exception as e:  # pylint: disable=broad-except
+        # Serializing models near the 2GB protobuf limit raises errors
+        # outside of torch.onnx.OnnxExporterError
+        print(f"Dynamo-based export failed, falling back to torch.onnx.export(): {e}")
+
+    if not exported:
+        _remove_if_exists(output_onnx)
+    return exported
+
+
+def _half_floating_point(value):
+    """
+    Cast the floating point tensors in value, which may be nested in
+    lists, tuples, and dicts (e.g., past_key_values), to half precision
+    """
+
+    if torch.is_tensor(value):
+        return value.half() if value.is_floating_point() else value
+    if isinstance(value, tuple) and hasattr(value, "_fields"):
+        return type(value)(*(_half_floating_point(item) for item in value))
+    if isinstance(value, (list, tuple)):
+        return type(value)(_half_floating_point(item) for item in value)
+    if isinstance(value, dict):
+        return {key: _half_floating_point(item) for key, item in value.items()}
+    return value
+
+
+def _parameter_bytes(model: torch.nn.Module) -> int:
+    """
+    Number of bytes taken by the parameters and buffers of a PyTorch model
+    """
+
+    return sum(
+        tensor.numel() * tensor.element_size()
+        for tensor in itertools.chain(model.parameters(), model.buffers())
+    )
+
+
+def _remove_if_exists(path: str):
+    """
+    Remove a file if it exists, with a single system call
+    """
+
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _link_or_copy(src: str, dst: str):
+    """
+    Make the contents of src available at dst. A hard link is used when
+    possible so that no bytes are copied, falling back to a full copy
+    (e.g., when src and dst are on different file systems).
+    """
+
+    _remove_if_exists(dst)
+
+    try:
+        os.link(src, dst)
+    except OSError:
+        size = os.path.getsize(src)
+        if size > 1024**3:
+            printing.log_warning(
+                f"Copying {size / 1024**3:.1f} GB from {src} to {dst}, since a "
+                "hard link could not be created. Placing the GroqFlow cache on the "
+                "same file system as your model avoids this copy."
+            )
+        shutil.copy2(src, dst)
+
+
+def _onnx_file_signature(onnx_file: str) -> List[int]:
+    """
+    Cheap fingerprint of an ONNX file. Including the device and inode means
+    that a hard link to a file matches it, but a different file with the
+    same size and modification time does not.
+    """
+
+    st = os.stat(onnx_file)
+    return [st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns]
+
+
+def _check_model(
+    onnx_file,
+    success_message,
+    fail_message,
+    state: build.GroqState = None,
+    skip_checker: bool = False,
+) -> bool:
+    # A single stat both confirms that the file exists and fingerprints it
+    try:
+        file_signature = _onnx_file_signature(onnx_file)
+    except FileNotFoundError:
+        print(fail_message)
+        return False
+    print(success_message)
+
+    # The stage that wrote the file already validated the model
+    if skip_checker:
+        return True
+
+    # Skip the check if this exact file was already checked by a previous stage
+    if state is not None and state.info.last_checked_signature == file_signature:
+        print("\tONNX file unchanged since it was last checked")
+        return True
+
+    try:
+        # Checking by path (rather than ModelProto) lets the checker handle
+        # models larger than the 2GB protobuf limit and external data
+        onnx.checker.check_model(onnx_file, full_check=False)
+        print("\tSuccessfully checked onnx file")
+        if state is not None:
+            state.info.last_checked_signature = file_signature
+        return True
+    except onnx.checker.ValidationError as e:
+        print("\tError while checking generated ONNX file")
+        print(e)
+        return False
+
+
+def _optimize_onnx(
+    input_onnx: str,
+    output_onnx: str,
+    opt_level: str,
+    model_bytes: Optional[int] = None,
+):
+    """
+    Use ONNX Runtime to apply graph optimizations to input_onnx and
+    save the optimized graph to output_onnx. model_bytes is the size of
+    input_onnx, including its external data, or an estimate of it, if the
+    caller already has one.
+    """
+
+    import onnxruntime
+
+    ort_opt_levels = {
+        ORT_OPT_LEVEL_BASIC: onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+        ORT_OPT_LEVEL_EXTENDED: onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    }
+    if opt_level not in ort_opt_levels:
+        msg = f"""
+        ONNX Runtime optimization level {opt_level} is not supported. Choose from
+        the supported values: {list(ort_opt_levels.keys())}.
+        """
+        raise exp.StageError(msg)
+
+    # Given that we're compiling against fixed input shapes, the shape related
+    # information inserted for dynamic shape inference is not needed. The
+    # extended level also fuses common subgraphs, except for the fusions that
+    # produce contrib ops.
+    opts = onnxruntime.SessionOptions()
+    opts.graph_optimization_level = ort_opt_levels[opt_level]
+    opts.optimized_model_filepath = output_onnx
+    # Used to suppress the warning output from ORT
+    opts.log_severity_level = 3
+    # The session is only used to write the optimized graph and never runs
+    # inference, so skip memory planning and GPU provider probing
+    opts.enable_cpu_mem_arena = False
+    opts.enable_mem_pattern = False
+    # Write the trained parameters of large models to an external data file
+    if model_bytes is None:
+        model_bytes = onnx_helpers.model_file_bytes(input_onnx)
+    if model_bytes > build.LARGE_MODEL_BYTES:
+        opts.add_session_config_entry(
+            "session.optimized_model_external_initializers_file_name",
+            onnx_helpers.external_data_location(output_onnx),
+        )
+        opts.add_session_config_entry(
+            "session.optimized_model_external_initializers_min_size_in_bytes",
+            str(onnx_helpers.EXTERNAL_DATA_MIN_BYTES),
+        )
+    _ = onnxruntime.InferenceSession(
+        input_onnx,
+        opts,
+        providers=["CPUExecutionProvider"],
+        disabled_optimizers=ORT_CONTRIB_FUSIONS,
+    )
+
+
+def _optimize_onnx_for_groq(
+    input_onnx: str,
+    output_onnx: str,
+    opt_level: str,
+    model_bytes: Optional[int] = None,
+) -> Tuple[str, Optional[onnx.ModelProto]]:
+    """
+    Optimize input_onnx at opt_level and fall back to the basic level if the
+    optimizations introduced ops that Groq Compiler does not support: ops
+    outside of the default ONNX domain (e.g., ONNX Runtime's com.microsoft
+    fused ops), or ops that ONNX does not define at the model's opset.
+
+    Returns the optimization level that was applied, along with the optimized
+    model (loaded without its external data) if it had to be loaded to
+    validate its ops, so that callers can reuse it instead of parsing
+    output_onnx again.
+    """
+
+    _optimize_onnx(input_onnx, output_onnx, opt_level, model_bytes)
+
+    if opt_level == ORT_OPT_LEVEL_BASIC:
+        return opt_level, None
+
+    optimized_model = onnx.load_model(output_onnx, load_external_data=False)
+    introduced_ops = sorted(onnx_helpers.unregistered_ops(optimized_model))
+
+    # Only domains that were not already in the input model can have been
+    # introduced by the optimizations. The input is rarely needed, since the
+    # fusions that produce contrib ops are disabled.
+    introduced_domains = onnx_helpers.custom_domains(optimized_model)
+    if introduced_domains:
+        input_model = onnx_helpers.load_model_metadata(input_onnx)
+        introduced_domains -= onnx_helpers.custom_domains(input_model)
+    introduced_ops += [f"{domain} ops" for domain in sorted(introduced_domains)]
+
+    if introduced_ops:
+        print(
+            f"Optimization level {opt_level} introduced unsupported ops "
+            f"{introduced_ops}, falling back to {ORT_OPT_LEVEL_BASIC}"
+        )
+        _optimize_onnx(input_onnx, output_onnx, ORT_OPT_LEVEL_BASIC, model_bytes)
+        return ORT_OPT_LEVEL_BASIC, None
+
+    return opt_level, optimized_model
+
+
+def _convert_to_fp16(
+    input_onnx: str, output_onnx: str, model: Optional[onnx.ModelProto] = None
+):
+    """
+    Cast the float32 tensors of input_onnx to float16 and save the result
+    to output_onnx. onnxconverter-common casts each initializer with a single
+    vectorized numpy operation instead of going through Python float lists.
+
+    model is input_onnx loaded without its external data, if the caller has
+    already loaded it. Either way, input_onnx is parsed at most once, and the
+    same ModelProto is used to look for float32 tensors, infer shapes, and
+    convert.
+    """
+
+    if model is None:
+        model = onnx.load_model(input_onnx, load_external_data=False)
+
+    # Models that are already float16 do not need to be rewritten
+    if not onnx_helpers.has_float32_tensors(model):
+        print("Model has no float32 tensors, skipping conversion")
+        _link_or_copy(input_onnx, output_onnx)
+        return
+
+    from onnxconverter_common import float16
+
+    op_block_list = [
+        op for op in float16.DEFAULT_OP_BLOCK_LIST if op not in FP16_LEGALIZE_OPS
+    ]
+
+    # A previous build may have left a hard link here (see above), which
+    # must not be written through
+    _remove_if_exists(output_onnx)
+
+    if any(
+        onnx.external_data_helper.uses_external_data(init)
+        for init in model.graph.initializer
+    ):
+        # Models with external data (e.g., models over the 2GB protobuf limit)
+        # only support shape inference from file to file. output_onnx is used
+        # as scratch space and is overwritten by the converted model below.
+        onnx.shape_inference.infer_shapes_path(input_onnx, output_onnx)
+        model = onnx.load_model(output_onnx)
+    else:
+        model = onnx.shape_inference.infer_shapes(model)
+
+    fp16_model = float16.convert_float_to_float16(
+        model, op_block_list=op_block_list, disable_shape_infer=True
+    )
+    onnx_helpers.save_model(fp16_model, output_onnx)
+
+
+class ExportPytorchModel(of_export.ExportPytorchModel):
+    """
+    Stage that takes a PyTorch model instance and exports it to ONNX.
+
+    Args:
+     - export_precision: precision of the exported model's trained parameters.
+        EXPORT_PRECISION_FP16 exports a half precision copy of the model, which
+        lets later stages skip the FP16 conversion. The model's forward() must
+        support half precision on the device that the model is on.
+     - do_constant_folding: whether torch.onnx.export() folds constants. Defaults
+        to folding constants unless the model is larger than build.LARGE_MODEL_BYTES,
+        since folding can expand ops like ones_like() into full-size constants
+        that push large models past the 2GB protobuf limit.
+     - use_dynamo_export: whether to export with torch.onnx.dynamo_export(),
+        which scales better than the TorchScript-based torch.onnx.export() on
+        large models. Requires torch>=2.1 and a torch.nn.Module. Only applies
+        to builds with onnx_opset=DYNAMO_EXPORT_OPSET, since the dynamo exporter
+        does not target other opsets. Falls back to torch.onnx.export() if the
+        dynamo export fails, or if the exported model's input names or opset do
+        not match the ones GroqFlow expects.
+
+    Expected inputs:
+     - state.model is a torch.nn.Module or torch.jit.ScriptModule
+     - state.inputs is a dict of inputs to the model's forward() method
+
+    Outputs:
+     - An ONNX file that implements state.model given state.inputs
+    """
+
+    skip_checker = False
+
+    def __init__(
+        self,
+        export_precision: str = EXPORT_PRECISION_FP32,
+        do_constant_folding: Optional[bool] = None,
+        use_dynamo_export: bool = False,
+    ):
+        super().__init__()
+
+        supported_precisions = [EXPORT_PRECISION_FP32, EXPORT_PRECISION_FP16]
+        if export_precision not in supported_precisions:
+            msg = f"""
+            ExportPytorchModel received export_precision={export_precision}, which is
+            not a supported value. Choose from the supported values: {supported_precisions}.
+            """
+            raise exp.ArgError(msg)
+
+        if use_dynamo_export and version.parse(torch.__version__) < version.parse(
+            "2.1"
+        ):
+            msg = f"""
+            ExportPytorchModel received use_dynamo_export=True, however dynamo-based
+            export requires torch>=2.1 (found {torch.__version__}).
+            """
+            raise exp.ArgError(msg)
+
+        self.export_precision = export_precision
+        self.do_constant_folding = do_constant_folding
+        self.use_dynamo_export = use_dynamo_export
+
+    def fire(self, state: build.GroqState):
+
+        if not isinstance(state.model, (torch.nn.Module, torch.jit.ScriptModule)):
+            msg = f"""
+            The current stage (ExportPytorchModel) is only compatible with
+            models of type torch.nn.Module or torch.jit.ScriptModule, however
+            the stage received a model of type {type(state.model)}.
+            """
+            raise exp.StageError(msg)
+
+        # Validate the dynamo-based export before any work is started
+        use_dynamo_export = self.use_dynamo_export
+        if use_dynamo_export and isinstance(state.model, torch.jit.ScriptModule):
+            msg = """
+            ExportPytorchModel received use_dynamo_export=True, however dynamo-based
+            export does not support models of type torch.jit.ScriptModule.
+            """
+            raise exp.StageError(msg)
+        if use_dynamo_export and state.config.onnx_opset != DYNAMO_EXPORT_OPSET:
+            print(
+                f"Dynamo-based export only produces opset {DYNAMO_EXPORT_OPSET}, "
+                f"exporting opset {state.config.onnx_opset} with torch.onnx.export()"
+            )
+            use_dynamo_export = False
+
+        export_fp16 = self.export_precision == EXPORT_PRECISION_FP16
+        if export_fp16:
+            # Cast a copy so that the user's model and inputs are left untouched
+            model = copy.deepcopy(state.model).half()
+            inputs = _half_floating_point(state.inputs)
+        else:
+            model = state.model
+            inputs = state.inputs
+
+        if isinstance(model, torch.jit.ScriptModule):
+            dummy_inputs = tuple(inputs.values())
+            dummy_input_names = tuple(inputs.keys())
+        else:
+            all_args = _forward_arg_names(model)
+
+            unknown_args = inputs.keys() - set(all_args)
+            if unknown_args:
+                msg = f"""
+                Input name(s) {sorted(unknown_args)} not found in the model's forward
+                method. Available input names are: {list(all_args)}
+                """
+                raise exp.StageError(msg)
+
+            # torch.onnx.export() maps inputs to the model's arguments by position,
+            # so the input names must follow the order of the forward() arguments
+            dummy_input_names = tuple(arg for arg in all_args if arg in inputs)
+
+            # torch.onnx.export() expects a tuple of positional inputs followed by
+            # a dict of keyword inputs. Pass the first input positionally, since a
+            # lone dict would be interpreted as a single positional input.
+            first_input = inputs[dummy_input_names[0]]
+            keyword_inputs = {name: inputs[name] for name in dummy_input_names[1:]}
+            dummy_inputs = (first_input, keyword_inputs)
+
+        # Save the inputs while the model is exported and checked,
+        # since these operations touch different files
+        inputs_saved = _run_in_background(
+            tensor_helpers.save_inputs,
+            [state.inputs],
+            state.original_inputs_file,
+            downcast=False,
+        )
+
+        try:
+            output_path = state.base_onnx_file
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            # A previous build may have left a hard link to a user's ONNX file
+            # here (see ReceiveOnnxModel), which must not be written through
+            _remove_if_exists(output_path)
+
+            # Trained parameters account for nearly all of an ONNX file's bytes,
+            # so their size stands in for the size of the exported model
+            parameter_bytes = _parameter_bytes(model)
+
+            # Send torch export warnings to stdout (and therefore the log file)
+            # so that they don't fill up the command line. catch_warnings()
+            # restores the default behavior, even if the export fails.
+            with warnings.catch_warnings():
+                warnings.showwarning = _warn_to_stdout
+
+                exported = use_dynamo_export and _dynamo_export(
+                    model,
+                    dummy_inputs,
+                    dummy_input_names,
+                    output_path,
+                    state.config.onnx_opset,
+                )
+
+                if not exported:
+                    # Constant folding is disabled for half precision exports
+                    # because of a known issue in the exporter's symbolic shape
+                    # inference
+                    if export_fp16:
+                        do_constant_folding = False
+                    elif self.do_constant_folding is None:
+                        do_constant_folding = parameter_bytes <= build.LARGE_MODEL_BYTES
+                    else:
+                        do_constant_folding = self.do_constant_folding
+
+                    torch.onnx.export(
+                        model,
+                        dummy_inputs,
+                        output_path,
+                        input_names=dummy_input_names,
+                        do_constant_folding=do_constant_folding,
+                        opset_version=state.config.onnx_opset,
+                        verbose=False,
+                    )
+
+            # Check if the base model has been exported successfully
+            success_msg = "\tSuccess exporting model to ONNX"
+            fail_msg = "\tFailed exporting model to ONNX"
+            model_valid = _check_model(
+                output_path, success_msg, fail_msg, state, self.skip_checker
+            )
+        finally:
+            # Don't leave the inputs being saved in the background
+            # if the export fails
+            concurrent.futures.wait([inputs_saved])
+
+        inputs_saved.result()
+
+        if model_valid:
+            state.intermediate_results = [output_path]
+            state.info.base_onnx_exported = True
+            state.info.base_onnx_bytes = parameter_bytes
+            if export_fp16:
+                state.info.converted_onnx_exported = True
+                state.downcast_applied = True
+        else:
+            msg = """
+            Unable to export model to ONNX using Torch's ONNX exporter.
+            We recommend that you modify your model until it is
+            compatible with this third party software, then re-run groqit().
+            More information may be available in the log file.
+            """
+            raise exp.StageError(msg)
+
+        return state
+
+
+class ReceiveOnnxModel(of_export.ReceiveOnnxModel):
+    """
+    Stage that takes an ONNX model as input and makes sure it uses a
+    supported opset and static input shapes.
+
+    Expected inputs:
+     - state.model is a path to an .onnx file
+
+    Outputs:
+     - A copy of the ONNX file, converted to the default opset if needed
+    """
+
+    skip_checker = False
+
+    def fire(self, state: build.GroqState):
+
+        if not isinstance(state.model, str) or not state.model.endswith(".onnx"):
+            msg = f"""
+            The current stage (ReceiveOnnxModel) is only compatible with paths
+            to .onnx files, however the stage received the model {state.model}.
+            """
+            raise exp.StageError(msg)
+
+        # Validate that the file exists and get its size with a single stat call
+        try:
+            onnx_file_size = os.stat(state.model).st_size
+        except FileNotFoundError:
+            msg = f"""
+            The current stage (ReceiveOnnxModel) received the path {state.model},
+            however no file exists at that path.
+            """
+            raise exp.StageError(msg)
+
+        # Only the graph's metadata is needed for validation, so skip
+        # loading the external data, if any
+        model = onnx.load_model(state.model, load_external_data=False)
+        model_dir = os.path.dirname(state.model)
+
+        # Record the size of the model so that later stages (e.g., the
+        # large-model handling in OptimizeOnnxModel) do not need to query it
+        base_onnx_bytes = onnx_file_size + onnx_helpers.external_data_bytes(
+            model, model_dir
+        )
+
+        opset = onnx_helpers.get_opset(model)
+
+        # Symbolic dimensions (e.g., "unk__") are stored in dim_param and leave
+        # dim_value at its default of 0, so map them to 0 explicitly
+        input_shapes = [
+            [
+                d.dim_value if d.HasField("dim_value") else 0
+                for d in _input.type.tensor_type.shape.dim
+            ]
+            for _input in model.graph.input
+        ]
+
+        # Check for dynamic shapes in the model. They can be represented as
+        # 0, -1, or "unk__".
+        if any(d < 1 for shape in input_shapes for d in shape):
+            msg = f"""
+            The received model has dynamic input dimensions. Please freeze the model
+            with static input dimensions. Input shapes: {input_shapes}
+            """
+            raise exp.StageError(msg)
+
+        if opset < build.MINIMUM_ONNX_OPSET:
+            msg = f"""
+            The received model has an opset {opset}. Opsets below
+            {build.MINIMUM_ONNX_OPSET} are not supported. Please try
+            upgrading the model to opset {build.DEFAULT_ONNX_OPSET}.
+            """
+            raise exp.StageError(msg)
+
+        # Save the inputs while the model is received and checked,
+        # since these operations touch different files
+        inputs_saved = _run_in_background(
+            tensor_helpers.save_inputs,
+            [state.inputs],
+            state.original_inputs_file,
+            downcast=False,
+        )
+
+        try:
+            output_path = state.base_onnx_file
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+            if opset < build.DEFAULT_ONNX_OPSET:
+                print(
+                    f"Converting the model from opset {opset} "
+                    f"to opset {build.DEFAULT_ONNX_OPSET}"
+                )
+                onnx.external_data_helper.load_external_data_for_model(model, model_dir)
+                # A previous build may have left a hard link to the user's file
+                # here, which must not be written through
+                _remove_if_exists(output_path)
+                onnx_helpers.save_model(
+                    onnx.version_converter.convert_version(
+                        model, build.DEFAULT_ONNX_OPSET
+                    ),
+                    output_path,
+                )
+            else:
+                _link_or_copy(state.model, output_path)
+
+            # Release the trained parameters before the model is checked
+            del model
+
+            # Check if the base model has been received successfully
+            success_msg = "\tSuccess receiving ONNX Model"
+            fail_msg = "\tFailed receiving ONNX Model"
+            model_valid = _check_model(
+                output_path, success_msg, fail_msg, state, self.skip_checker
+            )
+        finally:
+            # Don't leave the inputs being saved in the background
+            # if the model cannot be received
+            concurrent.futures.wait([inputs_saved])
+
+        inputs_saved.result()
+
+        if model_valid:
+            state.intermediate_results = [output_path]
+            state.info.base_onnx_exported = True
+            state.info.base_onnx_bytes = base_onnx_bytes
+        else:
+            msg = """
+            Unable to process ONNX Model. We recommend that you verify the source of the model.
+            Any optimizations performed on the model could result in an error.
+            More information may be available in the log file.
+            """
+            raise exp.StageError(msg)
+
+        return state
+
+
 class CheckOnnxCompatibility(stage.Stage):
     """
     Stage that takes an ONNX file, checks whether it is compatible
@@ -54,3 +824,246 @@ class CheckOnnxCompatibility(stage.Stage):
             raise exp.StageError(msg)
 
         return state
+
+
+class OptimizeOnnxModel(of_export.OptimizeOnnxModel):
+    """
+    Stage that takes an ONNX file and uses ONNX Runtime to optimize it.
+
+    Args:
+     - opt_level: ONNX Runtime graph optimization level. Fusions that produce
+        contrib ops are disabled, and the stage falls back to ORT_OPT_LEVEL_BASIC
+        if the optimizations still introduce ops outside of the default ONNX
+        domain or ops that ONNX does not define at the model's opset.
+
+    Expected inputs:
+     - state.intermediate_results contains a single .onnx file
+
+    Outputs:
+     - An optimized ONNX file
+    """
+
+    # ONNX Runtime validates the model while creating the session that
+    # writes the optimized file, so there is no need to check it again
+    skip_checker = True
+
+    def __init__(self, opt_level: str = ORT_OPT_LEVEL_EXTENDED):
+        super().__init__()
+        self.opt_level = opt_level
+
+    def fire(self, state: build.GroqState):
+
+        input_onnx = state.intermediate_results[0]
+        output_path = state.opt_onnx_file
+
+        state.info.onnx_opt_level, _ = _optimize_onnx_for_groq(
+            input_onnx, output_path, self.opt_level, state.info.base_onnx_bytes
+        )
+
+        # Check that the optimized model is still valid
+        success_msg = "\tSuccess optimizing ONNX model"
+        fail_msg = "\tFailed optimizing ONNX model"
+
+        if _check_model(output_path, success_msg, fail_msg, state, self.skip_checker):
+            state.intermediate_results = [output_path]
+            state.info.opt_onnx_exported = True
+        else:
+            msg = """
+            Unable to optimize ONNX file using ONNX Runtime.
+            More information may be available in the log file.
+            """
+            raise exp.StageError(msg)
+
+        return state
+
+
+class ConvertOnnxToFp16(of_export.ConvertOnnxToFp16):
+    """
+    Stage that takes an ONNX file and converts its trained parameters
+    to float16.
+
+    Expected inputs:
+     - state.intermediate_results contains a single .onnx file
+
+    Outputs:
+     - An ONNX file with FP16 trained parameters
+    """
+
+    skip_checker = False
+
+    def fire(self, state: build.GroqState):
+
+        input_onnx = state.intermediate_results[0]
+        output_path = state.converted_onnx_file
+
+        if state.info.converted_onnx_exported:
+            print(
+                "Model was exported with FP16 trained parameters, skipping conversion"
+            )
+            return state
+
+        # Send onnxconverter-common warnings to stdout (and therefore the log file)
+        # so that they don't fill up the command line. catch_warnings() restores
+        # the default behavior, even if the conversion fails.
+        with warnings.catch_warnings():
+            warnings.showwarning = _warn_to_stdout
+            _convert_to_fp16(input_onnx, output_path)
+
+        # Check that the converted model is still valid
+        success_msg = "\tSuccess converting ONNX model to fp16"
+        fail_msg = "\tFailed converting ONNX model to fp16"
+
+        if _check_model(output_path, success_msg, fail_msg, state, self.skip_checker):
+            state.intermediate_results = [output_path]
+            state.downcast_applied = True
+            state.info.converted_onnx_exported = True
+        else:
+            msg = """
+            Attempted to use onnxconverter-common, a third party library, to convert your
+            model to the float16 datatype, however this operation was not successful.
+            More information may be available in the log file.
+            """
+            raise exp.StageError(msg)
+
+        return state
+
+
+class OptimizeAndConvertFp16(stage.Stage):
+    """
+    Stage that takes an ONNX file, optimizes it with ONNX Runtime, and
+    converts its trained parameters to float16. Equivalent to running
+    OptimizeOnnxModel followed by ConvertOnnxToFp16, except that the optimized
+    model is parsed once, for both the validation of its ops and the FP16
+    conversion, and the ONNX checker only runs on the final model.
+
+    The optimization runs before the cast because ONNX Runtime's CPU
+    provider does not implement float16 kernels for many ops.
+
+    Args:
+     - opt_level: ONNX Runtime graph optimization level. Fusions that produce
+        contrib ops are disabled, and the stage falls back to ORT_OPT_LEVEL_BASIC
+        if the optimizations still introduce ops outside of the default ONNX
+        domain or ops that ONNX does not define at the model's opset.
+
+    Expected inputs:
+     - state.intermediate_results contains a single .onnx file
+
+    Outputs:
+     - An ONNX file with FP16 trained parameters
+    """
+
+    skip_checker = False
+
+    def __init__(self, opt_level: str = ORT_OPT_LEVEL_EXTENDED):
+        super().__init__(
+            unique_name="optimize_fp16",
+            monitor_message="Optimizing ONNX file and converting to FP16",
+        )
+        self.opt_level = opt_level
+
+    def fire(self, state: build.GroqState):
+
+        input_onnx = state.intermediate_results[0]
+        output_path = state.converted_onnx_file
+
+        # ONNX Runtime's CPU provider cannot optimize most FP16 graphs (see above).
+        # The exported model stands in for the optimized one so that it can
+        # still be inspected (e.g., with GroqModel.netron()).
+        if state.info.converted_onnx_exported:
+            print(
+                "Model was exported with FP16 trained parameters, "
+                "skipping optimization and conversion"
+            )
+            _link_or_copy(input_onnx, state.opt_onnx_file)
+            state.info.opt_onnx_exported = True
+            return state
+
+        # The optimized FP32 model is kept on disk so that it can be
+        # inspected (e.g., with GroqModel.netron())
+        state.info.onnx_opt_level, optimized_model = _optimize_onnx_for_groq(
+            input_onnx,
+            state.opt_onnx_file,
+            self.opt_level,
+            state.info.base_onnx_bytes,
+        )
+        state.info.opt_onnx_exported = True
+
+        with warnings.catch_warnings():
+            warnings.showwarning = _warn_to_stdout
+            _convert_to_fp16(state.opt_onnx_file, output_path, optimized_model)
+
+        success_msg = "\tSuccess optimizing and converting ONNX model to fp16"
+        fail_msg = "\tFailed optimizing and converting ONNX model to fp16"
+
+        if _check_model(output_path, success_msg, fail_msg, state, self.skip_checker):
+            state.intermediate_results = [output_path]
+            state.downcast_applied = True
+            state.info.converted_onnx_exported = True
+        else:
+            msg = """
+            Attempted to use onnxruntime and onnxconverter-common, third party libraries,
+            to optimize your model and convert it to the float16 datatype, however this
+            operation was not successful.
+            More information may be available in the log file.
+            """
+            raise exp.StageError(msg)
+
+        return state
+
+
+class ParallelStages(stage.Stage):
+    """
+    Stage that fires a group of independent stages at the same time
+    and merges their results, so that the group takes as long as its
+    slowest stage rather than the sum of all stages.
+
+    The stages must not depend on each other's outputs. Each stage is fired
+    against its own shallow copy of the state, and the members each stage
+    changed are merged back in the order the stages were provided. The
+    stages run in threads, which is sufficient because stages spend their
+    time in subprocesses and native code that release the GIL.
+
+    Limitations: the stages are fired directly rather than through the
+    Stage wrapper, which redirects the process-wide stdout to a log file and
+    cannot be shared between threads. As a result, the stages only show up
+    as a single step in the monitor, their output is interleaved in this
+    stage's log file, and an exception in one stage is only raised after
+    every other stage in the group has finished. Only group stages that each
+    take long enough for the overlap to outweigh those costs, and that a
+    failure of the other stages should not cut short.
+
+    Expected inputs:
+     - The inputs expected by every stage in the group
+
+    Outputs:
+     - The outputs of every stage in the group
+    """
+
+    def __init__(
+        self, unique_name: str, monitor_message: str, stages: List[stage.Stage]
+    ):
+        super().__init__(
+            unique_name=unique_name,
+            monitor_message=monitor_message,
+        )
+        self.stages = stages
+
+    def fire(self, state: build.GroqState):
+
+        original_info = copy.copy(state.info)
+
+        def fire_stage(child: stage.Stage):
+            child_state = copy.copy(state)
+            child_state.info = copy.copy(original_info)
+            return child.fire(child_state)
+
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=len(self.stages)
+        ) as executor:
+            # Raises the exception of the first stage that failed, if any
+            child_states = list(executor.map(fire_stage, self.stages))
+
+        for child_state in child_states:
+            _merge_state_changes(state, original_info, child_state)
+
+        return state
@@ -20,10 +20,9 @@ default_pytorch_export_sequence = stage.Sequence(
     "default_pytorch_export_sequence",
     "Exporting PyTorch Model",
     [
-        of_export.ExportPytorchModel(),
-        of_export.OptimizeOnnxModel(),
+        gf_export.ExportPytorchModel(),
+        gf_export.OptimizeAndConvertFp16(),
         gf_export.CheckOnnxCompatibility(),
-        of_export.ConvertOnnxToFp16(),
     ],
 )
 
@@ -41,8 +40,8 @@ pytorch_export_sequence_with_quantization = stage.Sequence(
     "pytorch_export_sequence_with_quantization",
     "Exporting PyTorch Model and Quantizing Exported ONNX",
     [
-        of_export.ExportPytorchModel(),
-        of_export.OptimizeOnnxModel(),
+        gf_export.ExportPytorchModel(),
+        gf_export.OptimizeOnnxModel(),
         gf_export.CheckOnnxCompatibility(),
         of_export.QuantizeONNXModel(),
     ],
@@ -63,9 +62,8 @@ default_keras_export_sequence = stage.Sequence(
     "Exporting Keras Model",
     [
         of_export.ExportKerasModel(),
-        of_export.OptimizeOnnxModel(),
+        gf_export.OptimizeAndConvertFp16(),
         gf_export.CheckOnnxCompatibility(),
-        of_export.ConvertOnnxToFp16(),
     ],
 )
 
@@ -84,10 +82,9 @@ default_onnx_sequence = stage.Sequence(
     "default_onnx_sequence",
     "Building ONNX Model",
     [
-        of_export.ReceiveOnnxModel(),
-        of_export.OptimizeOnnxModel(),
+        gf_export.ReceiveOnnxModel(),
+        gf_export.OptimizeAndConvertFp16(),
         gf_export.CheckOnnxCompatibility(),
-        of_export.ConvertOnnxToFp16(),
         compile.CompileOnnx(),
         compile.Assemble(),
     ],
@@ -98,7 +95,7 @@ default_hummingbird_sequence = stage.Sequence(
     "Building Hummingbird Model",
     [
         hummingbird.ConvertHummingbirdModel(),
-        of_export.OptimizeOnnxModel(),
+        gf_export.OptimizeOnnxModel(),
         gf_export.CheckOnnxCompatibility(),
         compile.CompileOnnx(),
         compile.Assemble(),